@@ -11,15 +11,22 @@ import logging
 import smtplib
 import imaplib
 import email
+import email.policy
+import itertools
 import re
 import secrets
+import signal
+import socket
 import string
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-from typing import Dict, List, Optional
+from email.message import EmailMessage
+from typing import Dict, Iterator, List, Optional, Set, Tuple
 
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from google.oauth2 import service_account
 
 
@@ -36,18 +43,28 @@ class Config:
         self.SMTP_HOST = os.getenv('SMTP_HOST', 'smtp.gmail.com')
         self.SMTP_PORT = int(os.getenv('SMTP_PORT', '587'))
 
+        # IMAP IDLE - keep one connection open and let the server push new mail
+        # instead of relying on the scheduler to poll
+        self.IMAP_IDLE = os.getenv('IMAP_IDLE', 'false').lower() == 'true'
+        self.IDLE_TIMEOUT = int(os.getenv('IDLE_TIMEOUT', '600'))  # Gmail drops idle sessions after ~10 min
+
         # Simple authorization - comma-separated list of authorized emails
-        self.AUTHORIZED_EMAILS = set([
+        self.AUTHORIZED_EMAILS = frozenset(
             email.strip().lower()
             for email in os.getenv('AUTHORIZED_EMAILS', '').split(',')
             if email.strip()
-        ])
+        )
 
         # Admin settings
         self.ADMIN_EMAIL = os.getenv('ADMIN_EMAIL')
         self.DEFAULT_ORG_UNIT = os.getenv('DEFAULT_ORG_UNIT', '/')
         self.LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
 
+        # Optional local snapshot of the domain's addresses, so new usernames need no
+        # API lookup. Only worth it where the file outlives a run (e.g. IMAP IDLE mode).
+        self.USER_SNAPSHOT_FILE = os.getenv('USER_SNAPSHOT_FILE', '')
+        self.USER_SNAPSHOT_MAX_AGE = int(os.getenv('USER_SNAPSHOT_MAX_AGE', '86400'))
+
         # Validate required settings
         self._validate_config()
 
@@ -79,17 +96,12 @@ logger = logging.getLogger(__name__)
 class SimpleAuth:
     """Simple email-based authorization for small non-profits"""
 
-    def __init__(self, authorized_emails: set):
+    def __init__(self, authorized_emails: frozenset):
         self.authorized_emails = authorized_emails
         logger.info(f"Initialized with {len(authorized_emails)} authorized emails")
 
     def is_authorized(self, email: str) -> bool:
         """Check if email is authorized to create accounts"""
-        # Clean up email address (remove display name if present)
-        email_match = re.search(r'<([^>]+)>', email)
-        if email_match:
-            email = email_match.group(1)
-
         email = email.lower().strip()
         is_auth = email in self.authorized_emails
 
@@ -102,8 +114,21 @@ class SimpleAuth:
 
 
 class GoogleWorkspaceManager:
+    # How long users_exist answers are trusted, in seconds. Misses expire sooner
+    # so an account created elsewhere is noticed quickly.
+    EXISTS_TTL = 300
+    MISSING_TTL = 60
+    EXISTS_CACHE_SIZE = 512
+
+    # Directory API calls sent per batch HTTP request
+    BATCH_SIZE = 50
+
     def __init__(self):
         self.service = None
+        self._exists_cache = {}  # email -> (exists, expires_at)
+        self._known_users = None  # every address in the domain, see _get_known_users
+        self._known_users_listed_at = 0
+        self._known_users_expire = 0
         self._initialize_service()
 
     def _initialize_service(self):
@@ -123,68 +148,290 @@ class GoogleWorkspaceManager:
                     scopes=['https://www.googleapis.com/auth/admin.directory.user']
                 )
 
-            self.service = build('admin', 'directory_v1', credentials=credentials)
+            # Use the discovery document bundled with google-api-python-client instead
+            # of downloading it on every start. build() creates one authorized HTTP
+            # transport for the service, which every call (including batches) reuses.
+            self.service = build('admin', 'directory_v1', credentials=credentials, static_discovery=True)
             logger.info("Google Admin SDK service initialized")
         except Exception as e:
             logger.error(f"Failed to initialize Google Admin SDK: {e}")
             raise
 
-    def create_user(self, user_data: Dict) -> Dict:
-        """Create a new user account"""
-        try:
-            temp_password = self._generate_password()
-
-            user = {
-                'name': {
-                    'givenName': user_data['first_name'],
-                    'familyName': user_data['last_name']
-                },
-                'primaryEmail': f"{user_data['username']}@{config.DOMAIN}",
-                'password': temp_password,
-                'orgUnitPath': config.DEFAULT_ORG_UNIT,
-                'changePasswordAtNextLogin': True,
-                'suspended': False
-            }
+    def create_users(self, users_data: List[Dict]) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+        """Create several user accounts, returning (result, error) for each"""
+        prepared = [self._build_user(user_data) for user_data in users_data]
+        # Inserts are not retried: a batch can fail after the users were created
+        responses = self._execute_batch(
+            [self.service.users().insert(body=user) for user, _ in prepared], retry_failed=False
+        )
+
+        outcomes = []
+        for (user, temp_password), (result, error) in zip(prepared, responses):
+            if error:
+                logger.error(f"Failed to create user: {error}")
+            else:
+                result['temp_password'] = temp_password
+                self._cache_exists(user['primaryEmail'], True)
+                if self._known_users is not None:
+                    self._known_users.add(user['primaryEmail'].lower())
+                logger.info(f"Created user: {user['primaryEmail']}")
+            outcomes.append((result, error))
+
+        if self._known_users is not None and any(error is None for _, error in outcomes):
+            self._save_known_users()
+
+        return outcomes
+
+    def _build_user(self, user_data: Dict) -> Tuple[Dict, str]:
+        """Build the Directory API user resource and its temporary password"""
+        temp_password = self._generate_password()
+
+        user = {
+            'name': {
+                'givenName': user_data['first_name'],
+                'familyName': user_data['last_name']
+            },
+            'primaryEmail': f"{user_data['username']}@{config.DOMAIN}",
+            'password': temp_password,
+            'orgUnitPath': config.DEFAULT_ORG_UNIT,
+            'changePasswordAtNextLogin': True,
+            'suspended': False
+        }
+
+        # Add optional fields
+        if user_data.get('department'):
+            user['organizations'] = [{
+                'department': user_data['department'],
+                'primary': True
+            }]
+
+        return user, temp_password
+
+    def users_exist(self, emails: List[str]) -> Dict[str, bool]:
+        """Check several users at once, keyed by lower-cased email"""
+        found = {}
+        unknown = []
+        known_users = self._get_known_users()
+        for email in dict.fromkeys(e.lower() for e in emails):
+            cached = self._exists_cache.get(email)
+            if known_users is not None and email not in known_users:
+                # Not in the directory snapshot - only confirm addresses that might be taken
+                found[email] = False
+            elif cached and cached[1] > time.monotonic():
+                found[email] = cached[0]
+            else:
+                unknown.append(email)
+
+        responses = self._execute_batch([self.service.users().get(userKey=email) for email in unknown])
+        for email, (_, error) in zip(unknown, responses):
+            if error and not (isinstance(error, HttpError) and error.resp.status == 404):
+                # Unexpected error - report as missing but don't remember it
+                found[email] = False
+                continue
 
-            # Add optional fields
-            if user_data.get('department'):
-                user['organizations'] = [{
-                    'department': user_data['department'],
-                    'primary': True
-                }]
+            found[email] = error is None
+            self._cache_exists(email, found[email])
 
-            result = self.service.users().insert(body=user).execute()
-            result['temp_password'] = temp_password
+        return found
 
-            logger.info(f"Created user: {user['primaryEmail']}")
-            return result
+    def _get_known_users(self) -> Optional[Set[str]]:
+        """Every address in the domain, from a snapshot refreshed once a day"""
+        if not config.USER_SNAPSHOT_FILE or self._known_users_expire > time.time():
+            return self._known_users
+
+        try:
+            snapshot = self._load_known_users()
 
+            # Age is taken from the listing itself - the file is rewritten on every create
+            if snapshot and snapshot[0] + config.USER_SNAPSHOT_MAX_AGE > time.time():
+                self._known_users_listed_at, self._known_users = snapshot
+            else:
+                self._known_users_listed_at = time.time()
+                self._known_users = self._list_all_addresses()
+                self._save_known_users()
+            self._known_users_expire = self._known_users_listed_at + config.USER_SNAPSHOT_MAX_AGE
+            logger.info(f"Loaded directory snapshot with {len(self._known_users)} addresses")
         except Exception as e:
-            logger.error(f"Failed to create user: {e}")
-            raise
+            logger.warning(f"Directory snapshot unavailable, checking users individually: {e}")
+            self._known_users = None
+            self._known_users_expire = time.time() + self.EXISTS_TTL
+
+        return self._known_users
 
-    def user_exists(self, email: str) -> bool:
-        """Check if user already exists"""
+    @staticmethod
+    def _load_known_users() -> Optional[Tuple[float, Set[str]]]:
+        """Read the snapshot file as (listed_at, addresses), or None if it is unusable"""
         try:
-            self.service.users().get(userKey=email).execute()
-            return True
-        except Exception:
-            return False
+            with open(config.USER_SNAPSHOT_FILE) as f:
+                snapshot = json.load(f)
+            return float(snapshot['listed_at']), {a.lower() for a in snapshot['addresses']}
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # Truncated, corrupt or from an older version - treated as stale and rebuilt
+            logger.warning(f"Ignoring unreadable directory snapshot: {e}")
+            return None
+
+    def _list_all_addresses(self) -> Set[str]:
+        """Page through the directory collecting primary addresses and aliases"""
+        addresses = set()
+        page_token = None
+        while True:
+            response = self.service.users().list(
+                domain=config.DOMAIN,
+                maxResults=500,
+                pageToken=page_token,
+                fields='users(primaryEmail,aliases,nonEditableAliases),nextPageToken'
+            ).execute()
+
+            for user in response.get('users', []):
+                addresses.add(user['primaryEmail'].lower())
+                addresses.update(alias.lower() for alias in user.get('aliases', []))
+                addresses.update(alias.lower() for alias in user.get('nonEditableAliases', []))
+
+            page_token = response.get('nextPageToken')
+            if not page_token:
+                return addresses
+
+    def _save_known_users(self):
+        """Write the directory snapshot so later runs can skip the listing"""
+        # Written aside and renamed into place, so an interrupted write never leaves
+        # a truncated file behind
+        temp_path = f"{config.USER_SNAPSHOT_FILE}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({
+                    'listed_at': self._known_users_listed_at,
+                    'addresses': sorted(self._known_users)
+                }, f)
+            os.replace(temp_path, config.USER_SNAPSHOT_FILE)
+        except OSError as e:
+            logger.warning(f"Could not save directory snapshot: {e}")
+
+    def _execute_batch(self, requests: List, retry_failed: bool = True) -> List[Tuple[Optional[Dict], Optional[Exception]]]:
+        """Run API requests as batch calls, returning (response, error) for each.
+
+        If a whole batch fails, its unanswered requests are retried one at a time,
+        or reported with the batch error when retry_failed is False.
+        """
+        responses = [None] * len(requests)
+
+        def callback(request_id, response, exception):
+            responses[int(request_id)] = (response, exception)
+
+        for start in range(0, len(requests), self.BATCH_SIZE):
+            chunk = range(start, min(start + self.BATCH_SIZE, len(requests)))
+            if len(chunk) == 1:
+                continue
+
+            batch = self.service.new_batch_http_request(callback=callback)
+            for index in chunk:
+                batch.add(requests[index], request_id=str(index))
+
+            try:
+                batch.execute()
+            except Exception as e:
+                if retry_failed:
+                    logger.warning(f"Batch request failed, retrying one at a time: {e}")
+                    continue
+
+                logger.error(f"Batch request failed: {e}")
+                for index in chunk:
+                    if responses[index] is None:
+                        responses[index] = (None, e)
+
+        # Single requests, and anything a failed batch did not answer, go out on their own
+        for index, request in enumerate(requests):
+            if responses[index] is None:
+                try:
+                    responses[index] = (request.execute(), None)
+                except Exception as e:
+                    responses[index] = (None, e)
+
+        return responses
+
+    def _cache_exists(self, email: str, exists: bool):
+        """Remember a users_exist answer, evicting the oldest entry when full"""
+        email = email.lower()
+        self._exists_cache.pop(email, None)
+        if len(self._exists_cache) >= self.EXISTS_CACHE_SIZE:
+            self._exists_cache.pop(next(iter(self._exists_cache)))
+
+        ttl = self.EXISTS_TTL if exists else self.MISSING_TTL
+        self._exists_cache[email] = (exists, time.monotonic() + ttl)
 
     def _generate_password(self) -> str:
         """Generate secure temporary password"""
         alphabet = string.ascii_letters + string.digits + "!@#$%^&*"
-        return ''.join(secrets.choice(alphabet) for _ in range(12))
+
+        # Draw random bytes in bulk, dropping the ones that would bias the modulo
+        limit = 256 - 256 % len(alphabet)
+        password = ''
+        while len(password) < 12:
+            password += ''.join(alphabet[b % len(alphabet)] for b in secrets.token_bytes(24) if b < limit)
+        return password[:12]
+
+
+# Account requests are short forms - anything past this is quoted history or signatures
+MAX_BODY_BYTES = 8192
+
+
+class _SocketReader:
+    """Buffered reader for the IMAP socket that survives read timeouts.
+
+    imaplib reads through socket.makefile(), which can't be read again after a
+    timeout. IDLE waits with a timeout, so we keep our own buffer instead.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.buffer = bytearray()
+
+    def readline(self, limit: int = -1) -> bytes:
+        while b'\n' not in self.buffer and (limit < 0 or len(self.buffer) < limit) and self._fill():
+            pass
+        end = self.buffer.find(b'\n') + 1 or len(self.buffer)
+        if limit >= 0:
+            end = min(end, limit)
+        return self._take(end)
+
+    def read(self, size: int) -> bytes:
+        while len(self.buffer) < size and self._fill():
+            pass
+        return self._take(size)
+
+    def close(self):
+        pass
+
+    def _fill(self) -> bool:
+        # Anything already buffered is kept if recv() times out
+        chunk = self.sock.recv(65536)
+        self.buffer += chunk
+        return bool(chunk)
+
+    def _take(self, size: int) -> bytes:
+        data = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return data
+
+
+class _IMAP4_SSL(imaplib.IMAP4_SSL):
+    """IMAP4_SSL reading through _SocketReader so IDLE can use timeouts"""
+
+    def open(self, *args, **kwargs):
+        super().open(*args, **kwargs)
+        self.file = _SocketReader(self.sock)
 
 
 class EmailProcessor:
     def __init__(self):
         self.mail = None
+        self.smtp = None
 
     def connect(self):
         """Connect to email server"""
         try:
-            self.mail = imaplib.IMAP4_SSL(config.EMAIL_HOST, config.EMAIL_PORT)
+            self.mail = _IMAP4_SSL(config.EMAIL_HOST, config.EMAIL_PORT)
             self.mail.login(config.EMAIL_USER, config.EMAIL_PASSWORD)
             logger.info("Connected to email server")
         except Exception as e:
@@ -194,68 +441,340 @@ class EmailProcessor:
     def disconnect(self):
         """Disconnect from email server"""
         if self.mail:
-            self.mail.close()
-            self.mail.logout()
+            try:
+                self.mail.close()
+                self.mail.logout()
+            except Exception as e:
+                logger.warning(f"Email disconnect failed: {e}")
+            self.mail = None
+
+        if self.smtp:
+            try:
+                self.smtp.quit()
+            except Exception as e:
+                logger.warning(f"SMTP disconnect failed: {e}")
+            self.smtp = None
+
+    def wait_for_new_mail(self, timeout: int, stop_event: threading.Event) -> bool:
+        """Block in IMAP IDLE (RFC 2177) until the server reports new mail"""
+        # Mail that arrived while the last batch was being processed
+        if self.mail.untagged_responses.pop('EXISTS', None):
+            return True
 
-    def get_unread_messages(self) -> List[Dict]:
-        """Get unread messages"""
+        tag = self.mail._new_tag()
+        self.mail.tagged_commands.pop(tag, None)
+        self.mail.send(tag + b' IDLE\r\n')
+
+        # Untagged responses may arrive before the continuation
+        new_mail = False
+        while True:
+            response = self._read_idle_line()
+            if response.startswith(b'+'):
+                break
+            if response.startswith(tag):
+                raise imaplib.IMAP4.error(f"IDLE not accepted: {response.strip()}")
+            new_mail = new_mail or self._is_new_mail(response)
+
+        logger.debug("Waiting for new mail (IDLE)")
+        deadline = time.monotonic() + timeout
+
+        # Wake up at least once a second so shutdown is not delayed by a quiet inbox
+        self.mail.sock.settimeout(1.0)
+        try:
+            while not new_mail and not stop_event.is_set() and time.monotonic() < deadline:
+                try:
+                    new_mail = self._is_new_mail(self._read_idle_line())
+                except socket.timeout:
+                    continue
+        finally:
+            self.mail.sock.settimeout(None)
+            self.mail.send(b'DONE\r\n')
+            while True:
+                line = self._read_idle_line()
+                if line.startswith(tag):
+                    break
+                new_mail = new_mail or self._is_new_mail(line)
+
+        return new_mail
+
+    def _read_idle_line(self) -> bytes:
+        """Read one response line while idling"""
+        line = self.mail.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("Connection closed during IDLE")
+        return line
+
+    @staticmethod
+    def _is_new_mail(line: bytes) -> bool:
+        """Check for an untagged '* N EXISTS' response"""
+        return re.match(rb'\* \d+ EXISTS', line) is not None
+
+    def iter_unread_messages(self) -> Iterator[Dict]:
+        """Yield unread messages one at a time"""
         try:
             self.mail.select('INBOX')
+            # The count SELECT reports is not new mail - see wait_for_new_mail
+            self.mail.untagged_responses.pop('EXISTS', None)
+
             _, message_numbers = self.mail.search(None, 'UNSEEN')
 
-            messages = []
-            for num in message_numbers[0].split():
-                _, msg_data = self.mail.fetch(num, '(RFC822)')
-                email_body = msg_data[0][1]
-                email_message = email.message_from_bytes(email_body)
-
-                messages.append({
-                    'number': num,
-                    'message': email_message,
-                    'subject': email_message['subject'] or '',
-                    'from': email_message['from'] or '',
-                    'body': self._get_email_body(email_message)
-                })
-
-            return messages
+            numbers = message_numbers[0].split()
+            if not numbers:
+                return
+
+            # Look at the MIME structure first so only the headers and the text/plain
+            # part are downloaded - not HTML alternatives, inline images or attachments
+            text_parts = self._find_text_parts(numbers)
+
+            by_section = {}
+            for num in numbers:
+                if num in text_parts:
+                    section = text_parts[num][0] if text_parts[num] else None
+                    by_section.setdefault(section, []).append(num)
+
+            # One FETCH per distinct text section (usually just one). BODY.PEEK leaves the
+            # \Seen flag alone - messages are marked read once they have been handled.
+            fetched = {}
+            for section, section_numbers in by_section.items():
+                items = 'BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)]'
+                if section:
+                    items += f' BODY.PEEK[{section}]'
+                fetched.update(self._fetch_items(section_numbers, f'({items})'))
+
+            # Fall back to the full message if the structure could not be parsed
+            fallback = [num for num in numbers if num not in text_parts]
+            if fallback:
+                fetched.update(self._fetch_items(fallback, '(BODY.PEEK[])'))
         except Exception as e:
             logger.error(f"Failed to get messages: {e}")
-            return []
+            return
+
+        for num in numbers:
+            # Drop the raw data as we go so only one message is decoded at a time
+            items = fetched.pop(num, {})
+            try:
+                if num in text_parts:
+                    header = next((v for k, v in items.items() if k.startswith(b'HEADER')), b'')
+                    email_message = email.message_from_bytes(header, policy=email.policy.default)
+                    body = ''
+                    if text_parts[num]:
+                        section, encoding, charset = text_parts[num]
+                        body = self._decode_text_part(items.get(section.encode(), b''), encoding, charset)
+                else:
+                    email_message = email.message_from_bytes(items.get(b'', b''), policy=email.policy.default)
+                    body = self._get_email_body(email_message)
+
+                subject = self._get_subject(email_message)
+                sender = self._get_sender(email_message)
+                from_header = self._get_raw_header(email_message, 'from')
+            except Exception as e:
+                logger.error(f"Failed to read message {num}: {e}")
+                continue
+
+            yield {
+                'number': num,
+                'message': email_message,
+                'subject': subject,
+                'from': sender,
+                'from_header': from_header,
+                'body': body
+            }
+
+    @staticmethod
+    def _get_subject(email_message) -> str:
+        """Decoded Subject header, or the raw value if it cannot be parsed"""
+        try:
+            return str(email_message['subject'] or '')
+        except Exception:
+            return EmailProcessor._get_raw_header(email_message, 'subject')
+
+    @staticmethod
+    def _get_raw_header(email_message, name: str) -> str:
+        """Header value as sent (unfolded, not decoded) - for logs and alerts"""
+        value = next((v for k, v in email_message.raw_items() if k.lower() == name), '')
+        value = value.encode('utf-8', 'surrogateescape').decode('utf-8', 'replace')
+        return ' '.join(value.split())
+
+    @staticmethod
+    def _get_sender(email_message) -> str:
+        """Address of the single From mailbox, or '' if there is none"""
+        # Only the parsed address is trusted - an encoded display name can look like
+        # an address once decoded (e.g. "=?utf-8?q?=3Cdirector@x.org=3E?= <a@b.c>")
+        try:
+            addresses = email_message['from'].addresses if email_message['from'] else ()
+        except Exception:
+            addresses = ()
+        return addresses[0].addr_spec if len(addresses) == 1 else ''
+
+    def _find_text_parts(self, numbers: List[bytes]) -> Dict[bytes, Optional[Tuple[str, str, str]]]:
+        """Map message numbers to the (section, encoding, charset) of their text/plain part"""
+        _, data = self.mail.fetch(b','.join(numbers), '(BODYSTRUCTURE)')
+
+        text_parts = {}
+        for response in self._join_literals(data):
+            num, _, rest = response.partition(b' ')
+            try:
+                attributes = self._parse_imap_list(rest)[0]
+                values = dict(zip(attributes[::2], attributes[1::2]))
+                if b'BODYSTRUCTURE' in values:
+                    text_parts[num] = self._find_text_part(values[b'BODYSTRUCTURE'])
+            except (IndexError, TypeError, ValueError) as e:
+                logger.warning(f"Could not parse structure of message {num}: {e}")
+
+        return text_parts
+
+    @staticmethod
+    def _join_literals(data: list) -> Iterator[bytes]:
+        """Rebuild FETCH responses that imaplib split around {n} literals"""
+        pending = b''
+        for item in data:
+            if isinstance(item, tuple):
+                prefix, literal = item
+                quoted = literal.replace(b'\\', b'\\\\').replace(b'"', b'\\"')
+                pending += re.sub(rb'\{\d+\}$', b'', prefix) + b'"' + quoted + b'"'
+            else:
+                yield pending + item
+                pending = b''
+
+    @staticmethod
+    def _parse_imap_list(data: bytes) -> list:
+        """Parse an IMAP parenthesized list into nested lists (NIL becomes None)"""
+        stack = [[]]
+        for token in re.finditer(rb'\(|\)|"((?:[^"\\]|\\.)*)"|([^\s()"]+)', data):
+            if token.group() == b'(':
+                stack.append([])
+            elif token.group() == b')':
+                item = stack.pop()
+                stack[-1].append(item)
+            elif token.group(1) is not None:
+                stack[-1].append(re.sub(rb'\\(.)', rb'\1', token.group(1)))
+            else:
+                atom = token.group(2)
+                stack[-1].append(None if atom.upper() == b'NIL' else atom)
+        if len(stack) != 1:
+            raise ValueError("Unbalanced parentheses")
+        return stack[0]
+
+    @staticmethod
+    def _find_text_part(structure: list, section: str = '') -> Optional[Tuple[str, str, str]]:
+        """Find the first text/plain part in a BODYSTRUCTURE, depth first"""
+        if isinstance(structure[0], list):
+            # Multipart: the child parts come first, followed by the subtype
+            children = itertools.takewhile(lambda part: isinstance(part, list), structure)
+            for index, part in enumerate(children, 1):
+                found = EmailProcessor._find_text_part(part, f"{section}.{index}" if section else str(index))
+                if found:
+                    return found
+            return None
+
+        content_type = (structure[0] or b'').lower(), (structure[1] or b'').lower()
+        if content_type == (b'text', b'plain'):
+            params = structure[2] or []
+            charset = dict(zip((name.lower() for name in params[::2]), params[1::2])).get(b'charset')
+            # A single-part message has its body at section 1
+            return section or '1', (structure[5] or b'7bit').decode().lower(), (charset or b'us-ascii').decode()
+        return None
+
+    def _fetch_items(self, numbers: List[bytes], items: str) -> Dict[bytes, Dict[bytes, bytes]]:
+        """FETCH body sections for many messages at once, keyed by number and section"""
+        _, data = self.mail.fetch(b','.join(numbers), items)
+
+        fetched = {}
+        num = None
+        for item in data:
+            # (b'<num> (BODY[<section>] {<size>}', <literal>) - further sections of the
+            # same message start with a space instead of the message number
+            if not isinstance(item, tuple):
+                continue
+
+            prefix, literal = item
+            if prefix[:1].isdigit():
+                num = prefix.split(None, 1)[0]
+            section = re.search(rb'BODY\[([^\]]*)\]', prefix)
+            fetched.setdefault(num, {})[section.group(1).upper() if section else b''] = literal
+
+        return fetched
+
+    def _decode_text_part(self, payload: bytes, encoding: str, charset: str) -> str:
+        """Decode a text part fetched on its own"""
+        # Rebuild the part's headers from BODYSTRUCTURE and let the email package decode
+        # it, so it reads exactly like the same part of a fully fetched message
+        headers = EmailMessage()
+        headers['Content-Type'] = 'text/plain'
+        headers.set_param('charset', charset)
+        headers['Content-Transfer-Encoding'] = encoding
+        part = email.message_from_bytes(headers.as_bytes() + payload, policy=email.policy.default)
+        return self._get_email_body(part)
 
     def _get_email_body(self, email_message) -> str:
         """Extract text body from email"""
-        if email_message.is_multipart():
-            for part in email_message.walk():
-                if part.get_content_type() == "text/plain":
-                    return part.get_payload(decode=True).decode('utf-8', errors='ignore')
-        else:
-            return email_message.get_payload(decode=True).decode('utf-8', errors='ignore')
-        return ""
+        part = email_message.get_body(preferencelist=('plain',))
+        if part is None:
+            return ""
+
+        try:
+            return part.get_content()[:MAX_BODY_BYTES]
+        except LookupError:
+            # Unknown charset - fall back to UTF-8
+            return part.get_payload(decode=True)[:MAX_BODY_BYTES].decode('utf-8', errors='ignore')
 
     def mark_as_read(self, message_number):
         """Mark email as read"""
-        self.mail.store(message_number, '+FLAGS', '\\Seen')
+        # A NO reply does not raise - without this check the message would be handled
+        # again on every run
+        typ, data = self.mail.store(message_number, '+FLAGS', '\\Seen')
+        if typ != 'OK':
+            raise imaplib.IMAP4.error(f"Could not mark message {message_number} as read: {data}")
 
     def send_notification(self, to_email: str, subject: str, body: str):
         """Send notification email"""
         try:
-            msg = MIMEMultipart()
+            msg = EmailMessage()
             msg['From'] = config.EMAIL_USER
             msg['To'] = to_email
             msg['Subject'] = subject
+            msg.set_content(body)
 
-            msg.attach(MIMEText(body, 'plain'))
+            try:
+                self._get_smtp().send_message(msg)
+            except (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError):
+                # The server closes idle sessions - reconnect once and retry
+                self.smtp = None
+                self._get_smtp().send_message(msg)
+
+            logger.info(f"Sent notification to {to_email}")
+        except Exception as e:
+            logger.error(f"Failed to send email to {to_email}: {e}")
 
+    def _get_smtp(self) -> smtplib.SMTP:
+        """Return the shared SMTP session, connecting on first use"""
+        if self.smtp is None:
             server = smtplib.SMTP(config.SMTP_HOST, config.SMTP_PORT)
             server.starttls()
             server.login(config.EMAIL_USER, config.EMAIL_PASSWORD)
+            self.smtp = server
+            logger.info("Connected to SMTP server")
+        return self.smtp
+
+
+# Simple patterns for parsing - one named group per request field
+_FIELD_PATTERNS = {
+    'first_name': r'(?:first[_\s]?name|fname)[:\s]+(?P<first_name>[a-zA-Z\s\-\.]+)',
+    'last_name': r'(?:last[_\s]?name|lname|surname)[:\s]+(?P<last_name>[a-zA-Z\s\-\.]+)',
+    'username': r'(?:username|user|email)[:\s]+(?P<username>[a-zA-Z0-9._-]+)',
+    'department': r'(?:department|dept|team)[:\s]+(?P<department>[a-zA-Z\s\-]+)',
+    'title': r'(?:title|position|role)[:\s]+(?P<title>[a-zA-Z\s\-]+)'
+}
+
+# All fields in a single pass over the body. The alternation sits inside a
+# lookahead so matches can overlap, just like separate searches per field.
+_REQUEST_PATTERN = re.compile(
+    '(?=' + '|'.join(f'(?:{pattern})' for pattern in _FIELD_PATTERNS.values()) + ')',
+    re.IGNORECASE
+)
 
-            server.sendmail(config.EMAIL_USER, to_email, msg.as_string())
-            server.quit()
-
-            logger.info(f"Sent notification to {to_email}")
-        except Exception as e:
-            logger.error(f"Failed to send email to {to_email}: {e}")
+# Start of quoted text in a reply or forward
+_REPLY_MARKER = re.compile(r'\n(?:On .* wrote:|-----Original Message-----|>)')
 
 
 class RequestParser:
@@ -263,21 +782,17 @@ class RequestParser:
     def parse_account_request(email_body: str, sender: str) -> Optional[Dict]:
         """Parse account creation request from email"""
         try:
-            # Simple patterns for parsing
-            patterns = {
-                'first_name': r'(?:first[_\s]?name|fname)[:\s]+([a-zA-Z\s\-\.]+)',
-                'last_name': r'(?:last[_\s]?name|lname|surname)[:\s]+([a-zA-Z\s\-\.]+)',
-                'username': r'(?:username|user|email)[:\s]+([a-zA-Z0-9._-]+)',
-                'department': r'(?:department|dept|team)[:\s]+([a-zA-Z\s\-]+)',
-                'title': r'(?:title|position|role)[:\s]+([a-zA-Z\s\-]+)'
-            }
-
             parsed_data = {'requester': sender}
 
-            for field, pattern in patterns.items():
-                match = re.search(pattern, email_body, re.IGNORECASE)
-                if match:
-                    parsed_data[field] = match.group(1).strip()
+            # Only look at the new text, not the quoted conversation below it
+            email_body = _REPLY_MARKER.split(email_body, maxsplit=1)[0]
+
+            for match in _REQUEST_PATTERN.finditer(email_body):
+                field = match.lastgroup
+                if field not in parsed_data:
+                    parsed_data[field] = match.group(field).strip()
+                    if len(parsed_data) > len(_FIELD_PATTERNS):
+                        break
 
             # Validate required fields
             required = ['first_name', 'last_name', 'username']
@@ -303,67 +818,169 @@ class NonProfitAccountAutomation:
         self.auth = SimpleAuth(config.AUTHORIZED_EMAILS)
         self.parser = RequestParser()
 
+        # Notifications go out in the background while the inbox is being processed.
+        # One worker, so every email goes through the same SMTP session.
+        self._smtp_pool = ThreadPoolExecutor(max_workers=1)
+        self._notifications = []
+
     def process_requests(self):
         """Main processing method"""
         try:
             logger.info("Starting account creation check")
 
             self.email_processor.connect()
-            messages = self.email_processor.get_unread_messages()
-
-            if not messages:
-                logger.info("No unread messages")
-                return
-
-            logger.info(f"Processing {len(messages)} messages")
-
-            for msg in messages:
-                self._process_single_request(msg)
+            self._process_inbox()
 
         except Exception as e:
             logger.error(f"Error in main process: {e}")
             self._send_admin_alert(f"Automation error: {e}")
         finally:
+            self._smtp_pool.shutdown(wait=True)
             self.email_processor.disconnect()
 
-    def _process_single_request(self, message: Dict):
-        """Process a single email request"""
+    def watch(self, stop_event: threading.Event):
+        """Process requests as they arrive, using IMAP IDLE between runs"""
+        logger.info("Starting IMAP IDLE watch")
+
+        try:
+            while not stop_event.is_set():
+                try:
+                    self.email_processor.connect()
+                    while not stop_event.is_set():
+                        self._process_inbox()
+                        self.email_processor.wait_for_new_mail(config.IDLE_TIMEOUT, stop_event)
+
+                except (imaplib.IMAP4.abort, OSError) as e:
+                    # Servers drop long-lived sessions from time to time - just reconnect.
+                    # Other IMAP errors (e.g. a rejected login) are not retried.
+                    logger.warning(f"IMAP connection lost, reconnecting: {e}")
+                    stop_event.wait(30)
+                except Exception as e:
+                    logger.error(f"Error in watch loop: {e}")
+                    self._send_admin_alert(f"Automation error: {e}")
+                    raise
+                finally:
+                    # Let queued notifications finish before the SMTP session closes
+                    wait(self._notifications)
+                    self.email_processor.disconnect()
+        finally:
+            self._smtp_pool.shutdown(wait=True)
+
+    def _process_inbox(self):
+        """Process all unread messages in the inbox"""
+        # Check every request as it arrives, then batch the Directory API calls
+        count = 0
+        requests = []
+        for msg in self.email_processor.iter_unread_messages():
+            count += 1
+            user_data = self._check_request(msg)
+            if user_data:
+                requests.append((msg, user_data))
+
+        if not count:
+            logger.info("No unread messages")
+            return
+
+        logger.info(f"Processed {count} messages, {len(requests)} valid requests")
+
+        if requests:
+            self._create_accounts(requests)
+
+    def _check_request(self, message: Dict) -> Optional[Dict]:
+        """Authorize and parse a single email request"""
         try:
             sender = message['from']
-            logger.info(f"Processing message from: {sender}")
+            logger.info(f"Processing message from: {message['from_header']}")
 
             # Check authorization
             if not self.auth.is_authorized(sender):
-                self._send_unauthorized_notification(sender)
                 self.email_processor.mark_as_read(message['number'])
-                return
+                self._send_unauthorized_notification(sender, message['from_header'])
+                return None
 
             # Parse request
             user_data = self.parser.parse_account_request(message['body'], sender)
             if not user_data:
-                self._send_invalid_format_notification(sender)
                 self.email_processor.mark_as_read(message['number'])
-                return
+                self._send_invalid_format_notification(sender)
+                return None
+
+            return user_data
+
+        except Exception as e:
+            self._handle_request_error(message, e)
+            return None
+
+    def _create_accounts(self, requests: List[Tuple[Dict, Dict]]):
+        """Create the accounts for a set of valid requests"""
+        try:
+            # Check if users exist
+            existing = self.gws_manager.users_exist(
+                [f"{user_data['username']}@{config.DOMAIN}" for _, user_data in requests]
+            )
+        except Exception as e:
+            for message, _ in requests:
+                self._handle_request_error(message, e)
+            return
 
-            # Check if user exists
+        to_create = []
+        for message, user_data in requests:
             email_address = f"{user_data['username']}@{config.DOMAIN}"
-            if self.gws_manager.user_exists(email_address):
-                self._send_user_exists_notification(sender, email_address)
+            if existing[email_address.lower()]:
+                self._send_user_exists_notification(message['from'], email_address)
                 self.email_processor.mark_as_read(message['number'])
-                return
+                continue
+
+            # A second request for the same username in this run finds the first one
+            existing[email_address.lower()] = True
+            to_create.append((message, user_data))
+
+        if not to_create:
+            return
+
+        # Create the accounts
+        try:
+            outcomes = self.gws_manager.create_users([user_data for _, user_data in to_create])
+        except Exception as e:
+            outcomes = [(None, e)] * len(to_create)
+
+        for (message, user_data), (result, error) in zip(to_create, outcomes):
+            if isinstance(error, HttpError) and error.resp.status == 409:
+                # Taken since the directory snapshot was made
+                self._send_user_exists_notification(message['from'], f"{user_data['username']}@{config.DOMAIN}")
+                self.email_processor.mark_as_read(message['number'])
+                continue
+
+            if error:
+                self._handle_request_error(message, error)
+                continue
 
-            # Create the account
-            result = self.gws_manager.create_user(user_data)
             self._send_success_notification(user_data, result)
 
             # Mark as processed
             self.email_processor.mark_as_read(message['number'])
 
-            logger.info(f"Successfully created account: {email_address}")
+            logger.info(f"Successfully created account: {user_data['username']}@{config.DOMAIN}")
 
-        except Exception as e:
-            logger.error(f"Error processing request from {message['from']}: {e}")
-            self._send_error_notification(message['from'], str(e))
+    def _handle_request_error(self, message: Dict, error: Exception):
+        """Report a request that failed and stop it being picked up again"""
+        logger.error(f"Error processing request from {message['from']}: {error}")
+        # Marked first, so a message that cannot be marked read is not answered
+        # again on every run
+        self.email_processor.mark_as_read(message['number'])
+        self._send_error_notification(message['from'], str(error))
+
+    def _notify(self, to_email: str, subject: str, body: str):
+        """Queue a notification email for the SMTP worker"""
+        if not to_email:
+            # From was missing, malformed or named several mailboxes
+            logger.warning(f"No single sender address, not sending: {subject}")
+            return
+
+        self._notifications = [f for f in self._notifications if not f.done()]
+        self._notifications.append(
+            self._smtp_pool.submit(self.email_processor.send_notification, to_email, subject, body)
+        )
 
     def _send_success_notification(self, user_data: Dict, result: Dict):
         """Send success notification"""
@@ -387,14 +1004,14 @@ Best regards,
 {config.DOMAIN} Account System
         """
 
-        self.email_processor.send_notification(user_data['requester'], subject, body)
+        self._notify(user_data['requester'], subject, body)
 
         # Notify admin
         admin_subject = f"New Account Created: {user_data['username']}@{config.DOMAIN}"
         admin_body = f"Account created for {user_data['first_name']} {user_data['last_name']} requested by {user_data['requester']}"
-        self.email_processor.send_notification(config.ADMIN_EMAIL, admin_subject, admin_body)
+        self._notify(config.ADMIN_EMAIL, admin_subject, admin_body)
 
-    def _send_unauthorized_notification(self, sender: str):
+    def _send_unauthorized_notification(self, sender: str, from_header: str):
         """Send unauthorized notification"""
         subject = "❌ Account Creation Request - Not Authorized"
         body = f"""Hello,
@@ -407,12 +1024,13 @@ Best regards,
 {config.DOMAIN} Account System
         """
 
-        self.email_processor.send_notification(sender, subject, body)
+        self._notify(sender, subject, body)
 
-        # Alert admin
-        admin_subject = f"🚨 Unauthorized Account Request from {sender}"
-        self.email_processor.send_notification(config.ADMIN_EMAIL, admin_subject,
-                                               f"Unauthorized account creation attempt from {sender}")
+        # Alert admin - with the From header as sent, which may not hold one address
+        admin_subject = f"🚨 Unauthorized Account Request from {sender or 'unknown sender'}"
+        self._notify(config.ADMIN_EMAIL, admin_subject,
+                     f"Unauthorized account creation attempt from {sender or 'unknown sender'}\n"
+                     f"From: {from_header}")
 
     def _send_invalid_format_notification(self, sender: str):
         """Send invalid format notification"""
@@ -435,7 +1053,7 @@ Best regards,
 {config.DOMAIN} Account System
         """
 
-        self.email_processor.send_notification(sender, subject, body)
+        self._notify(sender, subject, body)
 
     def _send_user_exists_notification(self, sender: str, email_address: str):
         """Send user exists notification"""
@@ -450,7 +1068,7 @@ Best regards,
 {config.DOMAIN} Account System
         """
 
-        self.email_processor.send_notification(sender, subject, body)
+        self._notify(sender, subject, body)
 
     def _send_error_notification(self, sender: str, error: str):
         """Send error notification"""
@@ -467,19 +1085,27 @@ Best regards,
 {config.DOMAIN} Account System
         """
 
-        self.email_processor.send_notification(sender, subject, body)
+        self._notify(sender, subject, body)
 
     def _send_admin_alert(self, message: str):
         """Send admin alert"""
         subject = "🚨 Google Workspace Automation Alert"
-        self.email_processor.send_notification(config.ADMIN_EMAIL, subject, message)
+        self._notify(config.ADMIN_EMAIL, subject, message)
 
 
 def main():
     """Main entry point"""
     try:
         automation = NonProfitAccountAutomation()
-        automation.process_requests()
+
+        if config.IMAP_IDLE:
+            # Stop cleanly between messages when the platform shuts us down
+            stop_event = threading.Event()
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+            signal.signal(signal.SIGINT, lambda signum, frame: stop_event.set())
+            automation.watch(stop_event)
+        else:
+            automation.process_requests()
         logger.info("✅ Account automation completed successfully")
     except Exception as e:
         logger.error(f"💥 Fatal error: {e}")
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# main.py reads its configuration at import time
+os.environ.setdefault('DOMAIN', 'test.org')
+os.environ.setdefault('EMAIL_USER', 'accounts@test.org')
+os.environ.setdefault('EMAIL_PASSWORD', 'test')
+os.environ.setdefault('ADMIN_EMAIL', 'admin@test.org')
+os.environ.setdefault('AUTHORIZED_EMAILS', 'director@test.org')
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
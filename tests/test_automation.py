@@ -0,0 +1,44 @@
+from concurrent.futures import wait
+
+import pytest
+
+from main import GoogleWorkspaceManager, NonProfitAccountAutomation
+
+
+@pytest.fixture
+def automation(monkeypatch):
+    monkeypatch.setattr(GoogleWorkspaceManager, '_initialize_service', lambda self: None)
+    automation = NonProfitAccountAutomation()
+    automation.sent = []
+    automation.marked = []
+    monkeypatch.setattr(automation.email_processor, 'send_notification',
+                        lambda to, subject, body: automation.sent.append((to, subject, body)))
+    monkeypatch.setattr(automation.email_processor, 'mark_as_read', automation.marked.append)
+    yield automation
+    automation._smtp_pool.shutdown()
+
+
+def check(automation, message):
+    result = automation._check_request(message)
+    wait(automation._notifications)
+    return result
+
+
+def message(sender, from_header, body=''):
+    return {'number': b'1', 'from': sender, 'from_header': from_header, 'subject': '', 'body': body}
+
+
+def test_unauthorized_sender_is_answered_and_reported(automation):
+    assert check(automation, message('stranger@evil.com', 'Stranger <stranger@evil.com>')) is None
+
+    assert automation.marked == [b'1']
+    assert [to for to, _, _ in automation.sent] == ['stranger@evil.com', 'admin@test.org']
+    assert 'From: Stranger <stranger@evil.com>' in automation.sent[1][2]
+
+
+def test_sender_without_single_address_is_only_reported(automation):
+    assert check(automation, message('', 'director@test.org, other@test.org')) is None
+
+    assert automation.marked == [b'1']
+    assert [to for to, _, _ in automation.sent] == ['admin@test.org']
+    assert 'From: director@test.org, other@test.org' in automation.sent[0][2]
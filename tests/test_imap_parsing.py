@@ -0,0 +1,189 @@
+import base64
+import imaplib
+
+import pytest
+
+from main import EmailProcessor
+
+
+# Responses in the shape imaplib's fetch() returns them
+NESTED_STRUCTURE = (
+    b'3 (BODYSTRUCTURE ((("text" "plain" ("charset" "UTF-8") NIL NIL "base64" 60 1 NIL NIL NIL)'
+    b'("text" "html" ("charset" "UTF-8") NIL NIL "quoted-printable" 90 2 NIL NIL NIL)'
+    b' "alternative" ("boundary" "000000000000a1") NIL NIL)'
+    b'("application" "pdf" ("name" "form.pdf") NIL NIL "base64" 9999 NIL'
+    b' ("attachment" ("filename" "form.pdf")) NIL) "mixed" ("boundary" "000000000000a2") NIL NIL))'
+)
+LITERAL_STRUCTURE = [
+    (b'4 (BODYSTRUCTURE (("text" "plain" ("charset" "us-ascii") NIL NIL "7bit" 12 1 NIL NIL NIL)'
+     b'("application" "pdf" ("name" {9}', b'a "b".pdf'),
+    b') NIL NIL "base64" 9999 NIL NIL NIL) "mixed" ("boundary" "b1") NIL NIL))',
+]
+SINGLE_STRUCTURE = (
+    b'5 (BODYSTRUCTURE ("text" "plain" ("charset" "utf-8") NIL NIL "quoted-printable" 30 2 NIL NIL NIL NIL))'
+)
+HTML_STRUCTURE = b'6 (BODYSTRUCTURE ("text" "html" ("charset" "utf-8") NIL NIL "7bit" 30 2 NIL NIL NIL NIL))'
+
+
+def test_parse_imap_list():
+    parsed = EmailProcessor._parse_imap_list(b'(A "b c" NIL ("d\\"e" 12) ())')
+    assert parsed == [[b'A', b'b c', None, [b'd"e', b'12'], []]]
+
+
+def test_join_literals_quotes_literal_back_into_response():
+    responses = list(EmailProcessor._join_literals(LITERAL_STRUCTURE + [SINGLE_STRUCTURE]))
+
+    assert len(responses) == 2
+    assert b'("name" "a \\"b\\".pdf")' in responses[0]
+    assert responses[1] == SINGLE_STRUCTURE
+
+
+def test_find_text_part_in_nested_multipart():
+    structure = EmailProcessor._parse_imap_list(NESTED_STRUCTURE.partition(b' ')[2])[0][1]
+    assert EmailProcessor._find_text_part(structure) == ('1.1', 'base64', 'UTF-8')
+
+
+def test_find_text_part_in_single_part_message():
+    structure = EmailProcessor._parse_imap_list(SINGLE_STRUCTURE.partition(b' ')[2])[0][1]
+    assert EmailProcessor._find_text_part(structure) == ('1', 'quoted-printable', 'utf-8')
+
+
+def test_find_text_part_without_plain_text():
+    structure = EmailProcessor._parse_imap_list(HTML_STRUCTURE.partition(b' ')[2])[0][1]
+    assert EmailProcessor._find_text_part(structure) is None
+
+
+class FakeMail:
+    """Replays recorded imaplib responses keyed by the FETCH items requested"""
+
+    def __init__(self, numbers, responses):
+        self.numbers = numbers
+        self.responses = responses
+        self.store_result = 'OK'
+        self.untagged_responses = {}
+        self.searches = []
+        self.fetches = []
+
+    def select(self, mailbox):
+        return 'OK', [b'10']
+
+    def search(self, charset, *criteria):
+        self.searches.append((charset, criteria))
+        return 'OK', [self.numbers]
+
+    def fetch(self, message_set, items):
+        self.fetches.append((message_set, items))
+        return 'OK', self.responses[items]
+
+    def store(self, message_set, command, flags):
+        return self.store_result, [b'done']
+
+
+def make_processor(numbers, responses):
+    processor = EmailProcessor()
+    processor.mail = FakeMail(numbers, responses)
+    return processor
+
+
+def test_fetch_items_with_multiple_sections_per_message():
+    processor = make_processor(b'', {
+        '(ITEMS)': [
+            (b'3 (BODY[HEADER.FIELDS (FROM SUBJECT)] {22}', b'From: a@test.org\r\n\r\n'),
+            (b' BODY[1.1] {4}', b'dGVz'),
+            b')',
+            (b'5 (BODY[1] {5}', b'hello'),
+            (b' BODY[HEADER.FIELDS ("FROM" "SUBJECT")] {22}', b'From: b@test.org\r\n\r\n'),
+            b' FLAGS (\\Recent))',
+        ]
+    })
+
+    fetched = processor._fetch_items([b'3', b'5'], '(ITEMS)')
+
+    assert fetched[b'3'] == {b'HEADER.FIELDS (FROM SUBJECT)': b'From: a@test.org\r\n\r\n', b'1.1': b'dGVz'}
+    assert fetched[b'5'][b'1'] == b'hello'
+    assert fetched[b'5'][b'HEADER.FIELDS ("FROM" "SUBJECT")'] == b'From: b@test.org\r\n\r\n'
+
+
+def test_iter_unread_messages_fetches_only_text_parts():
+    request = b'First Name: Jane\nLast Name: Doe\nUsername: jane.doe\n'
+    processor = make_processor(b'3 5 6 7', {
+        '(BODYSTRUCTURE)': [
+            NESTED_STRUCTURE, SINGLE_STRUCTURE, HTML_STRUCTURE, b'7 (BODYSTRUCTURE ("text" "plain"',
+        ],
+        '(BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)] BODY.PEEK[1.1])': [
+            (b'3 (BODY[HEADER.FIELDS (FROM SUBJECT)] {60}',
+             b'From: Director <director@test.org>\r\nSubject: New Account Request\r\n\r\n'),
+            (b' BODY[1.1] {72}', base64.encodebytes(request)),
+            b')',
+        ],
+        '(BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)] BODY.PEEK[1])': [
+            (b'5 (BODY[HEADER.FIELDS (FROM SUBJECT)] {20}', b'From: b@test.org\r\n\r\n'),
+            (b' BODY[1] {17}', b'caf=C3=A9 =\r\nsoft'),
+            b')',
+        ],
+        '(BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)])': [
+            (b'6 (BODY[HEADER.FIELDS (FROM SUBJECT)] {20}', b'From: c@test.org\r\n\r\n'),
+            b')',
+        ],
+        # Message 7's structure is cut off, so it is fetched in full instead
+        '(BODY.PEEK[])': [
+            (b'7 (BODY[] {48}', b'From: d@test.org\r\nSubject: Hi\r\n\r\nUsername: d\r\n'),
+            b')',
+        ],
+    })
+
+    messages = {m['number']: m for m in processor.iter_unread_messages()}
+
+    assert list(messages) == [b'3', b'5', b'6', b'7']
+    assert processor.mail.searches == [(None, ('UNSEEN',))]
+    assert messages[b'3']['from'] == 'director@test.org'
+    assert messages[b'3']['subject'] == 'New Account Request'
+    assert messages[b'3']['body'] == request.decode()
+    assert messages[b'5']['body'] == 'café soft'
+    assert messages[b'6']['body'] == ''
+    assert messages[b'7']['body'] == 'Username: d\r\n'
+    assert not any('BODY.PEEK[]' in items for numbers, items in processor.mail.fetches if numbers != b'7')
+
+
+def test_iter_unread_messages_uses_parsed_sender_address():
+    headers = [
+        b'From: =?utf-8?q?=3Cdirector@test.org=3E?= <attacker@evil.com>\r\n\r\n',
+        b'From: "\r\n\r\n',
+        b'From: <a@[>\r\n\r\n',
+    ]
+    processor = make_processor(b'3 4 5', {
+        '(BODYSTRUCTURE)': [HTML_STRUCTURE.replace(b'6', num, 1) for num in (b'3', b'4', b'5')],
+        '(BODY.PEEK[HEADER.FIELDS (FROM SUBJECT)])': [
+            item
+            for num, header in zip((b'3', b'4', b'5'), headers)
+            for item in ((num + b' (BODY[HEADER.FIELDS (FROM SUBJECT)] {%d}' % len(header), header), b')')
+        ],
+    })
+
+    messages = {m['number']: m for m in processor.iter_unread_messages()}
+
+    assert list(messages) == [b'3', b'4', b'5']
+    assert messages[b'3']['from'] == 'attacker@evil.com'
+    assert messages[b'3']['from_header'] == '=?utf-8?q?=3Cdirector@test.org=3E?= <attacker@evil.com>'
+    assert messages[b'4']['from'] == ''
+    assert messages[b'4']['from_header'] == '"'
+    assert messages[b'5']['from'] == ''
+    assert messages[b'5']['from_header'] == '<a@[>'
+
+
+def test_mark_as_read_raises_when_store_is_refused():
+    processor = make_processor(b'', {})
+    processor.mark_as_read(b'3')
+
+    processor.mail.store_result = 'NO'
+    with pytest.raises(imaplib.IMAP4.error):
+        processor.mark_as_read(b'3')
+
+
+def test_decode_text_part_is_lenient_and_uses_the_part_charset():
+    processor = EmailProcessor()
+
+    assert processor._decode_text_part(b'VXNlcm5hbWU6IGpk', 'base64', 'utf-8') == 'Username: jd'
+    assert processor._decode_text_part(b'VXNlcm5hbWU6IGpkZQ', 'base64', 'utf-8') == 'Username: jde'
+    assert processor._decode_text_part(b'Jos\xe9', '8bit', 'iso-8859-1') == 'José'
+    assert processor._decode_text_part(b'Jos\xc3\xa9', '8bit', 'x-unknown') == 'José'
@@ -0,0 +1,68 @@
+import random
+import re
+
+from main import _FIELD_PATTERNS, _REPLY_MARKER, RequestParser
+
+
+# Building blocks for random request bodies - labels for every field (and near misses),
+# separators, values and noise
+LABELS = [
+    'First Name', 'first_name', 'fname', 'Last Name', 'lastname', 'lname', 'Surname',
+    'Username', 'user', 'Email', 'Department', 'dept', 'Team', 'Title', 'Position', 'Role',
+    'firstname', 'last', 'name', 'users', 'titles',
+]
+SEPARATORS = [':', ': ', ' ', ':\t', '', '  :  ']
+VALUES = [
+    'Jane', 'Doe', "O'Brien", 'jane.doe', 'j_doe-2', 'Mary-Ann', 'St. John', 'Sales',
+    'Vice President', 'café', '123', 'a@b.org', '',
+]
+NOISE = ['\n', '\r\n', ' ', ',', '-', '.', 'Thanks!', 'Hi,']
+REPLY_MARKERS = ['\nOn Mon, Jan 1 Director wrote:', '\n> ', '\n-----Original Message-----']
+
+
+def random_body(rng):
+    pieces = []
+    for _ in range(rng.randint(0, 12)):
+        if rng.random() < 0.7:
+            pieces.append(rng.choice(LABELS) + rng.choice(SEPARATORS) + rng.choice(VALUES))
+        pieces.append(rng.choice(REPLY_MARKERS if rng.random() < 0.05 else NOISE))
+    if rng.random() < 0.5:
+        # Make sure plenty of bodies are complete requests
+        pieces.append('\nfirst name: Ann\nlast name: Lee\nusername: ann.lee')
+    return ''.join(pieces)
+
+
+def parse_per_field(email_body, sender):
+    """Reference parser: one search per field, as before the single-pass pattern"""
+    email_body = _REPLY_MARKER.split(email_body, maxsplit=1)[0]
+    parsed_data = {'requester': sender}
+    for field, pattern in _FIELD_PATTERNS.items():
+        match = re.search(pattern, email_body, re.IGNORECASE)
+        if match:
+            parsed_data[field] = match.group(field).strip()
+
+    required = ['first_name', 'last_name', 'username']
+    return parsed_data if all(field in parsed_data for field in required) else None
+
+
+def test_parse_account_request():
+    body = 'First Name: Jane\nLast Name: Doe\nUsername: jane.doe\nDepartment: Sales\nTitle: Volunteer\n'
+
+    parsed = RequestParser.parse_account_request(body, 'director@test.org')
+
+    assert parsed['requester'] == 'director@test.org'
+    assert parsed['username'] == 'jane.doe'
+    assert parsed['title'] == 'Volunteer'
+
+
+def test_parse_account_request_ignores_quoted_reply():
+    body = 'First Name: Jane\nLast Name: Doe\n\nOn Mon, Jan 1 Director wrote:\n> Username: old.name\n'
+
+    assert RequestParser.parse_account_request(body, 'director@test.org') is None
+
+
+def test_single_pass_matches_per_field_search():
+    rng = random.Random(1234)
+    for _ in range(5000):
+        body = random_body(rng)
+        assert RequestParser.parse_account_request(body, 'd@test.org') == parse_per_field(body, 'd@test.org'), body
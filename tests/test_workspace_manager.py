@@ -0,0 +1,213 @@
+import json
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import main
+from main import GoogleWorkspaceManager
+
+
+def http_error(status):
+    return HttpError(httplib2.Response({'status': status}), b'')
+
+
+class FakeRequest:
+    def __init__(self, service, call):
+        self.service = service
+        self.call = call
+
+    def execute(self):
+        self.service.executed.append(self.call)
+        return self.service.respond(self.call)
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append((request_id, request))
+
+    def execute(self):
+        self.service.batches.append([request.call for _, request in self.requests])
+        if self.service.fail_batches:
+            raise OSError('connection reset')
+        for request_id, request in self.requests:
+            try:
+                self.callback(request_id, self.service.respond(request.call), None)
+            except HttpError as e:
+                self.callback(request_id, None, e)
+
+
+class FakeService:
+    """Directory API stand-in holding a set of existing addresses"""
+
+    def __init__(self, addresses=(), fail_batches=False):
+        self.addresses = set(addresses)
+        self.fail_batches = fail_batches
+        self.batches = []
+        self.executed = []
+        self.listings = 0
+
+    def users(self):
+        return self
+
+    def get(self, userKey):
+        return FakeRequest(self, ('get', userKey))
+
+    def insert(self, body):
+        return FakeRequest(self, ('insert', body['primaryEmail']))
+
+    def list(self, **kwargs):
+        return FakeRequest(self, ('list', None))
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+    def respond(self, call):
+        method, email = call
+        if method == 'list':
+            self.listings += 1
+            return {'users': [{'primaryEmail': address} for address in sorted(self.addresses)]}
+        if method == 'get':
+            if email not in self.addresses:
+                raise http_error(404)
+            return {'primaryEmail': email}
+        if email in self.addresses:
+            raise http_error(409)
+        self.addresses.add(email)
+        return {'primaryEmail': email}
+
+
+@pytest.fixture
+def make_manager(monkeypatch):
+    monkeypatch.setattr(GoogleWorkspaceManager, '_initialize_service', lambda self: None)
+
+    def make(service):
+        manager = GoogleWorkspaceManager()
+        manager.service = service
+        return manager
+
+    return make
+
+
+@pytest.mark.parametrize('content', ['{"listed_at": 17', '["taken@test.org"]'])
+def test_unreadable_snapshot_is_rebuilt(make_manager, monkeypatch, tmp_path, content):
+    path = tmp_path / 'users.json'
+    path.write_text(content)
+    monkeypatch.setattr(main.config, 'USER_SNAPSHOT_FILE', str(path))
+    service = FakeService({'taken@test.org'})
+
+    known = make_manager(service)._get_known_users()
+
+    assert known == {'taken@test.org'}
+    assert service.listings == 1
+    assert json.loads(path.read_text())['addresses'] == ['taken@test.org']
+    assert not (tmp_path / 'users.json.tmp').exists()
+
+
+def test_fresh_snapshot_is_used_without_listing(make_manager, monkeypatch, tmp_path):
+    path = tmp_path / 'users.json'
+    path.write_text(json.dumps({'listed_at': main.time.time(), 'addresses': ['Taken@test.org']}))
+    monkeypatch.setattr(main.config, 'USER_SNAPSHOT_FILE', str(path))
+    service = FakeService()
+
+    assert make_manager(service)._get_known_users() == {'taken@test.org'}
+    assert service.listings == 0
+
+
+def test_execute_batch_splits_requests_into_batches(make_manager):
+    service = FakeService({'taken@test.org'})
+    manager = make_manager(service)
+    emails = [f'user{i}@test.org' for i in range(2 * GoogleWorkspaceManager.BATCH_SIZE)] + ['taken@test.org']
+
+    responses = manager._execute_batch([service.get(userKey=email) for email in emails])
+
+    assert [len(batch) for batch in service.batches] == [GoogleWorkspaceManager.BATCH_SIZE] * 2
+    # A lone request left over is sent on its own
+    assert service.executed == [('get', 'taken@test.org')]
+    assert responses[-1] == ({'primaryEmail': 'taken@test.org'}, None)
+    assert all(error.resp.status == 404 for _, error in responses[:-1])
+
+
+def test_execute_batch_retries_a_failed_batch_one_at_a_time(make_manager):
+    service = FakeService({'a@test.org'}, fail_batches=True)
+    manager = make_manager(service)
+
+    responses = manager._execute_batch([service.get(userKey=e) for e in ('a@test.org', 'b@test.org')])
+
+    assert service.executed == [('get', 'a@test.org'), ('get', 'b@test.org')]
+    assert responses[0] == ({'primaryEmail': 'a@test.org'}, None)
+    assert responses[1][1].resp.status == 404
+
+
+def test_execute_batch_reports_a_failed_batch_without_retry(make_manager):
+    service = FakeService(fail_batches=True)
+    manager = make_manager(service)
+
+    responses = manager._execute_batch(
+        [service.insert(body={'primaryEmail': e}) for e in ('a@test.org', 'b@test.org')], retry_failed=False
+    )
+
+    assert service.executed == []
+    assert [type(error) for _, error in responses] == [OSError, OSError]
+
+
+def test_users_exist_caches_answers(make_manager):
+    service = FakeService({'taken@test.org'})
+    manager = make_manager(service)
+
+    assert manager.users_exist(['Taken@test.org', 'free@test.org']) == {'taken@test.org': True, 'free@test.org': False}
+    assert manager.users_exist(['taken@test.org', 'free@test.org']) == {'taken@test.org': True, 'free@test.org': False}
+    assert len(service.batches) == 1
+
+
+def test_users_exist_does_not_cache_unexpected_errors(make_manager, monkeypatch):
+    def respond(call):
+        raise http_error(500)
+
+    service = FakeService()
+    manager = make_manager(service)
+    monkeypatch.setattr(service, 'respond', respond)
+
+    assert manager.users_exist(['a@test.org']) == {'a@test.org': False}
+    assert 'a@test.org' not in manager._exists_cache
+
+
+def test_users_exist_skips_lookups_for_addresses_missing_from_snapshot(make_manager, monkeypatch, tmp_path):
+    monkeypatch.setattr(main.config, 'USER_SNAPSHOT_FILE', str(tmp_path / 'users.json'))
+    service = FakeService({'taken@test.org'})
+    manager = make_manager(service)
+
+    assert manager.users_exist(['taken@test.org', 'free@test.org']) == {'taken@test.org': True, 'free@test.org': False}
+    assert service.executed == [('list', None), ('get', 'taken@test.org')]
+
+
+def test_create_users_returns_a_result_or_error_per_user(make_manager):
+    service = FakeService({'taken@test.org'})
+    manager = make_manager(service)
+    users = [{'first_name': 'A', 'last_name': 'B', 'username': name} for name in ('new', 'taken')]
+
+    (created, error), (result, conflict) = manager.create_users(users)
+
+    assert error is None
+    assert created['primaryEmail'] == 'new@test.org'
+    assert len(created['temp_password']) == 12
+    assert manager.users_exist(['new@test.org']) == {'new@test.org': True}
+    assert service.executed == []
+    assert result is None
+    assert conflict.resp.status == 409
+
+
+def test_generate_password_drops_bytes_that_would_bias_it(make_manager, monkeypatch):
+    alphabet = main.string.ascii_letters + main.string.digits + "!@#$%^&*"
+    draws = iter([bytes(range(210, 234)), bytes([209, 255, 0, 70, 140] + [1] * 19)])
+    monkeypatch.setattr(main.secrets, 'token_bytes', lambda size: next(draws))
+
+    password = make_manager(FakeService())._generate_password()
+
+    # 210 and above are rejected; 209 is the last usable byte
+    assert password == alphabet[209 % 70] + alphabet[0] * 3 + alphabet[1] * 8